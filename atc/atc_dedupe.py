@@ -0,0 +1,83 @@
+"""Finds duplicate ATC recordings by fingerprinting their sample blocks."""
+import argparse
+from concurrent import futures
+import io
+import os
+import struct
+
+from atc import atc_file_structure as afs
+from atc import atc_fingerprint
+from atc import atc_reader
+
+
+def fingerprint_file(path):
+    """Fingerprints the sample blocks of an ATC file.
+
+       Every block's checksum is verified, as ATCReader does, and samples are hashed as raw bytes in the same pass
+       that verifies their block's checksum, without decoding them.
+
+       Args:
+         path (str) Path of the ATC file.
+       Returns: (fingerprint, status) The recording fingerprint (as ATCReader.fingerprint()) and an atc_reader
+                status code.  fingerprint is None unless status is READ_SUCCESS.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None, atc_reader.NO_FILE
+    blocks, status = atc_reader._read_block_table(io.BytesIO(data), len(data))
+    if status != atc_reader.READ_SUCCESS:
+        return None, status
+    block_hashes = {}
+    view = memoryview(data)
+    for (block_id, offset, size) in blocks:
+        if block_id not in dict(afs.block_types):
+            continue
+        checksum_offset = offset + size - 4
+        checksum = struct.unpack_from(afs.endianness + 'I', data, checksum_offset)[0]
+        if checksum != sum(view[offset:checksum_offset]):
+            return None, atc_reader.CORRUPT_DATA
+        block_id_str = block_id.decode('ascii')
+        if block_id_str in atc_fingerprint.sample_block_ids:
+            hasher = atc_fingerprint.block_hasher()
+            hasher.update(view[offset + afs.block_prefix_size:checksum_offset])
+            block_hashes[block_id_str] = hasher.hexdigest()
+    return atc_fingerprint.recording_fingerprint(block_hashes), atc_reader.READ_SUCCESS
+
+
+def find_duplicates(directory, max_workers=None):
+    """Groups the .atc files under a directory by the fingerprint of their sample blocks.
+
+       Files are fingerprinted in parallel worker processes.  Files which cannot be read are ignored.
+
+       Args:
+         directory (str) The directory to search.
+         max_workers (int) The number of worker processes, defaults to the number of CPUs.
+       Returns: (dict) Lists of two or more paths with identical sample data, keyed by fingerprint.
+    """
+    paths = []
+    for root, _, file_names in os.walk(directory):
+        paths += [os.path.join(root, file_name) for file_name in file_names if file_name.endswith('.atc')]
+    paths.sort()
+    groups = {}
+    with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for path, (fingerprint, status) in zip(paths, executor.map(fingerprint_file, paths, chunksize=16)):
+            if fingerprint is not None:
+                groups.setdefault(fingerprint, []).append(path)
+    return {fingerprint: group for (fingerprint, group) in groups.items() if len(group) > 1}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lists ATC recordings with identical sample data.')
+    parser.add_argument('directory', help='Directory to search for .atc files.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+    for fingerprint, group in sorted(find_duplicates(args.directory, args.workers).items()):
+        print(fingerprint)
+        for path in group:
+            print('  ' + path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from atc import atc_dedupe
+from atc import atc_reader
+from atc import atc_rewrite
+from atc.atc_reader import ATCReader
+
+
+class TestATCDedupe(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_fingerprint_matches_reader(self):
+        for name in ['1_lead.atc', '6_lead.atc', '6_lead_ab.atc']:
+            path = os.path.join('atc/test_data', name)
+            fingerprint, status = atc_dedupe.fingerprint_file(path)
+            self.assertEqual(status, atc_reader.READ_SUCCESS)
+            self.assertEqual(fingerprint, ATCReader(path, fingerprint=True).fingerprint())
+
+    def test_fingerprint_reports_read_errors(self):
+        self.assertEqual(atc_dedupe.fingerprint_file('nonexistent_file.atc'), (None, atc_reader.NO_FILE))
+        self.assertEqual(atc_dedupe.fingerprint_file('atc/test_data/broken_checksum.atc'),
+                         (None, atc_reader.CORRUPT_DATA))
+
+    def test_fingerprint_verifies_all_blocks(self):
+        with open('atc/test_data/1_lead.atc', 'rb') as f:
+            atc_bytes = bytearray(f.read())
+        # Format block of this file is bytes 288 to 308.
+        cases = {'corrupt_fmt.atc': (atc_bytes[:296] + b'\0' + atc_bytes[297:], atc_reader.CORRUPT_DATA),
+                 'missing_fmt.atc': (atc_bytes[:288] + atc_bytes[308:], atc_reader.MISSING_DATA)}
+        for name, (modified_bytes, expected_status) in cases.items():
+            path = os.path.join(self.temp_dir, name)
+            with open(path, 'wb') as f:
+                f.write(modified_bytes)
+            self.assertEqual(ATCReader(path).status(), expected_status)
+            self.assertEqual(atc_dedupe.fingerprint_file(path), (None, expected_status))
+        self.assertEqual(atc_dedupe.fingerprint_file(self.temp_dir), (None, atc_reader.NO_FILE))
+
+    def test_finds_reuploaded_recordings(self):
+        os.makedirs(os.path.join(self.temp_dir, 'a'))
+        os.makedirs(os.path.join(self.temp_dir, 'b'))
+        original = os.path.join(self.temp_dir, 'a', '6_lead.atc')
+        reuploaded = os.path.join(self.temp_dir, 'b', 'reuploaded.atc')
+        shutil.copy('atc/test_data/6_lead.atc', original)
+        atc_rewrite.rewrite(original, reuploaded, info={'recording_uuid': 'a-new-uuid'})
+        shutil.copy('atc/test_data/1_lead.atc', os.path.join(self.temp_dir, 'a'))
+        shutil.copy('atc/test_data/broken_checksum.atc', os.path.join(self.temp_dir, 'b'))
+        duplicates = atc_dedupe.find_duplicates(self.temp_dir, max_workers=2)
+        self.assertEqual(list(duplicates.values()), [[original, reuploaded]])
+
+
+if __name__ == '__main__':
+    unittest.main()
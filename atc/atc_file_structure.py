@@ -22,6 +22,12 @@ lead_ids = ['ecg ', 'ecg2', 'ecg3', 'ecg4', 'ecg5', 'ecg6']
 avg_ids = ['avg ', 'avg2']
 
 
+# Length of the header (signature and version) in bytes.
+header_size = 8 + 4
+
+# Length of the block ID and uint32_t length at the start of every block.
+block_prefix_size = atc_block_id_len + 4
+
 # Note: Every block starts with atc_block_id_len bytes, followed by uint32_t length, and ends with uint32_t checksum.
 block_container_size = atc_block_id_len + (2 * 4)
 
@@ -0,0 +1,167 @@
+"""Baseline and mains notch filters for ECG samples, corresponding to the ATC format flags.
+
+Filters are cascades of biquad IIR sections.  Each section is evaluated in blocks of samples with precomputed
+matrices, so filtering is vectorized over all leads and samples in a block while remaining exactly equal to
+sample-by-sample IIR filtering.  Requires numpy.
+"""
+import math
+
+import numpy as np
+
+
+BASELINE_CUTOFF_HZ = 0.1  # Cutoff of the ATC baseline filter.
+NOTCH_Q = 30.0            # Quality factor of the mains notch filter.
+BLOCK_SIZE = 256          # Samples filtered per matrix product.
+
+
+def baseline_filter_coefficients(sample_rate_hz, cutoff_hz=BASELINE_CUTOFF_HZ):
+    """Coefficients (b, a) of a second order Butterworth high-pass filter which removes baseline wander."""
+    w0 = 2 * math.pi * cutoff_hz / sample_rate_hz
+    alpha = math.sin(w0) / math.sqrt(2)  # Q = 1/sqrt(2)
+    cos_w0 = math.cos(w0)
+    b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    return [x / a[0] for x in b], [x / a[0] for x in a]
+
+
+def notch_filter_coefficients(sample_rate_hz, mains_frequency_hz, q=NOTCH_Q):
+    """Coefficients (b, a) of a second order notch filter which removes mains interference."""
+    w0 = 2 * math.pi * mains_frequency_hz / sample_rate_hz
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    b = [1, -2 * cos_w0, 1]
+    a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    return [x / a[0] for x in b], [x / a[0] for x in a]
+
+
+class _Biquad:
+    """A biquad section in transposed direct form II, evaluated block_size samples at a time.
+
+       The state space form of the section is s[n+1] = A s[n] + B x[n], y[n] = C s[n] + D x[n], with C = [1, 0].
+       Over a block of L samples this gives y = T x + O s[0] and s[L] = A^L s[0] + S x, where T is the lower
+       triangular Toeplitz matrix of the impulse response.
+    """
+    def __init__(self, b, a, block_size):
+        b0, b1, b2 = b
+        a1, a2 = a[1], a[2]
+        self.A = np.array([[-a1, 1.0], [-a2, 0.0]])
+        self.B = np.array([b1 - a1 * b0, b2 - a2 * b0])
+        self.dc_gain = sum(b) / sum(a)
+        self.powers = np.empty((block_size + 1, 2, 2))  # A^n
+        self.powers[0] = np.eye(2)
+        for n in range(1, block_size + 1):
+            self.powers[n] = self.A @ self.powers[n - 1]
+        self.AnB = self.powers[:block_size] @ self.B  # A^n B
+        self.O = self.powers[:block_size, 0, :]  # C A^n
+        h = np.concatenate([[b0], self.AnB[:block_size - 1, 0]])  # Impulse response
+        lag = np.arange(block_size)[:, None] - np.arange(block_size)[None, :]
+        self.T = np.where(lag >= 0, h[np.maximum(lag, 0)], 0.0)
+
+    def steady_state(self, x0):
+        """State of the section after a long run of constant input x0, one row per lead."""
+        return x0[:, None] * np.linalg.solve(np.eye(2) - self.A, self.B)[None, :]
+
+    def filter_block(self, x, s):
+        """Filters x (leads, l), l <= block_size, from state s (leads, 2).  Returns (y, new state)."""
+        l = x.shape[1]
+        y = x @ self.T[:l, :l].T + s @ self.O[:l].T
+        s = s @ self.powers[l].T + x @ self.AnB[:l][::-1]
+        return y, s
+
+
+class ECGFilter:
+    """Baseline high-pass and mains notch filter for one or more ECG leads.
+
+       apply() filters whole leads.  filter() filters consecutive chunks of a stream, keeping the filter state
+       between calls.  The state is initialized from the first samples, as if the signal had been constant before
+       them, to avoid a step response at the start of the recording.
+    """
+    def __init__(self, sample_rate_hz, mains_frequency_hz=60, baseline=True, notch=True,
+                 baseline_cutoff_hz=BASELINE_CUTOFF_HZ, notch_q=NOTCH_Q, block_size=BLOCK_SIZE):
+        """Designs the filters for a recording's sample rate and mains frequency.
+
+           Args:
+             sample_rate_hz (int) The sample rate of the recording, i.e. ATCReader.sample_rate_hz().
+             mains_frequency_hz (int) The mains frequency to remove, i.e. ATCReader.mains_frequency_hz().
+             baseline (bool) Apply the baseline filter.
+             notch (bool) Apply the mains notch filter.
+             baseline_cutoff_hz (float) Cutoff frequency of the baseline filter.
+             notch_q (float) Quality factor of the notch filter.  Higher values give a narrower notch.
+             block_size (int) The number of samples filtered per matrix product.
+        """
+        self.__sample_rate_hz = sample_rate_hz
+        self.__mains_frequency_hz = mains_frequency_hz
+        self.__baseline = baseline
+        self.__notch = notch
+        self.__block_size = block_size
+        self.__sections = []
+        if baseline:
+            self.__sections.append(
+                    _Biquad(*baseline_filter_coefficients(sample_rate_hz, baseline_cutoff_hz), block_size))
+        if notch:
+            self.__sections.append(
+                    _Biquad(*notch_filter_coefficients(sample_rate_hz, mains_frequency_hz, notch_q), block_size))
+        self.__state = None
+
+    def sample_rate_hz(self):
+        """The sample rate the filters were designed for."""
+        return self.__sample_rate_hz
+
+    def mains_frequency_hz(self):
+        """The mains frequency the notch filter removes."""
+        return self.__mains_frequency_hz
+
+    def flags(self):
+        """The ATC flags describing data filtered with this filter, as accepted by ATCWriter.write_header."""
+        return {'baseline_filter': self.__baseline, 'notch_mains_filter': self.__notch}
+
+    def reset(self):
+        """Resets the stream state, so the next call to filter() starts a new stream."""
+        self.__state = None
+
+    def filter(self, samples):
+        """Filters the next chunk of a stream.
+
+           Args:
+             samples (array) Samples of one lead with shape (n,), or of several leads with shape (leads, n).
+                             The number of leads must not change between calls.
+           Returns: (np.ndarray) Filtered samples, with the same shape as samples.
+        """
+        y, self.__state = self.__filter(samples, self.__state)
+        return y
+
+    def apply(self, samples):
+        """Filters complete leads, independently of any stream in progress.
+
+           Args:
+             samples (array) Samples of one lead with shape (n,), or of several leads with shape (leads, n).
+           Returns: (np.ndarray) Filtered samples, with the same shape as samples.
+        """
+        return self.__filter(samples, None)[0]
+
+    def apply_atc(self, samples):
+        """Filters a complete lead and rounds the result to ATC units.  Returns ([int])"""
+        y = self.apply(samples)
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int64).tolist()
+
+    def __filter(self, samples, state):
+        x = np.asarray(samples, dtype=np.float64)
+        single_lead = x.ndim == 1
+        x = np.atleast_2d(x)
+        if x.shape[1] == 0 or not self.__sections:
+            return (x[0] if single_lead else x).copy(), state
+        if state is None:
+            state, x0 = [], x[:, 0]
+            for section in self.__sections:
+                state.append(section.steady_state(x0))
+                x0 = x0 * section.dc_gain
+        elif state[0].shape[0] != x.shape[0]:
+            raise ValueError('Expected %d leads, got %d' % (state[0].shape[0], x.shape[0]))
+        state = list(state)
+        y = np.empty_like(x)
+        for start in range(0, x.shape[1], self.__block_size):
+            block = x[:, start:start + self.__block_size]
+            for i, section in enumerate(self.__sections):
+                block, state[i] = section.filter_block(block, state[i])
+            y[:, start:start + self.__block_size] = block
+        return (y[0] if single_lead else y), state
@@ -0,0 +1,118 @@
+import io
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from atc import atc_filter
+from atc import atc_reader
+from atc.atc_filter import ECGFilter
+from atc.atc_reader import ATCReader
+from atc.atc_writer import ATCWriter
+
+
+def _lfilter(b, a, x, s):
+    """Reference sample-by-sample transposed direct form II biquad."""
+    y = []
+    s1, s2 = s
+    for v in x:
+        out = b[0] * v + s1
+        s1 = b[1] * v - a[1] * out + s2
+        s2 = b[2] * v - a[2] * out
+        y.append(out)
+    return y
+
+
+def _sine(frequency_hz, sample_rate_hz, n):
+    return np.sin(2 * math.pi * frequency_hz * np.arange(n) / sample_rate_hz)
+
+
+class TestECGFilter(unittest.TestCase):
+
+    def test_matches_sample_by_sample_filter(self):
+        x = np.random.RandomState(0).randn(1000) * 100
+        b, a = atc_filter.notch_filter_coefficients(300, 60)
+        expected = _lfilter(b, a, x, (0.0, 0.0))
+        section = atc_filter._Biquad(b, a, 64)
+        y, _ = section.filter_block(x[None, :64], np.zeros((1, 2)))
+        np.testing.assert_allclose(y[0], expected[:64], atol=1e-9)
+        # Steady state initialization is the reference filter run after a constant input.
+        ecg_filter = ECGFilter(300, 60, baseline=False, block_size=64)
+        s = _lfilter(b, a, [x[0]] * 2000 + list(x), (0.0, 0.0))[2000:]
+        np.testing.assert_allclose(ecg_filter.apply(x), s, atol=1e-6)
+
+    def test_chunked_filter_matches_whole_lead(self):
+        x = np.random.RandomState(1).randn(2, 5000) * 100 + 300
+        ecg_filter = ECGFilter(300, 50, block_size=128)
+        expected = ecg_filter.apply(x)
+        chunks = [ecg_filter.filter(x[:, i:i + 777]) for i in range(0, 5000, 777)]
+        np.testing.assert_allclose(np.concatenate(chunks, axis=1), expected, atol=1e-6)
+        with self.assertRaises(ValueError):
+            ecg_filter.filter(x[:1])
+        ecg_filter.reset()
+        np.testing.assert_allclose(ecg_filter.filter(x[0]), expected[0], atol=1e-6)
+
+    def test_notch_removes_mains(self):
+        n = 9000
+        signal = _sine(10, 300, n)
+        y = ECGFilter(300, 60, baseline=False).apply(signal + _sine(60, 300, n))
+        # Ignore the settling time of the notch.
+        self.assertLess(np.max(np.abs(y[600:] - signal[600:])), 0.05)
+
+    def test_baseline_filter_removes_offset_and_wander(self):
+        n = 30000
+        signal = _sine(5, 300, n)
+        y = ECGFilter(300, notch=False).apply(signal + 1000 + 50 * _sine(0.01, 300, n))
+        self.assertLess(np.max(np.abs(y - signal)), 5.0)
+
+    def test_reader_filters_on_demand(self):
+        reader = ATCReader('atc/test_data/6_lead.atc')
+        self.assertEqual(reader.status(), atc_reader.READ_SUCCESS)
+        filtered = reader.get_filtered_ecg_samples(2)
+        expected = ECGFilter(reader.sample_rate_hz(), reader.mains_frequency_hz()).apply(reader.get_ecg_samples(2))
+        np.testing.assert_allclose(filtered, expected)
+        # 1_lead.atc is mains filtered, so only the baseline filter is applied.
+        reader = ATCReader('atc/test_data/1_lead.atc')
+        filtered = reader.get_filtered_ecg_samples(1)
+        expected = ECGFilter(reader.sample_rate_hz(), notch=False).apply(reader.get_ecg_samples(1))
+        np.testing.assert_allclose(filtered, expected)
+
+    def test_writer_sets_filter_flags(self):
+        reader = ATCReader('atc/test_data/6_lead.atc')
+        ecg_filter = ECGFilter(reader.sample_rate_hz(), reader.mains_frequency_hz())
+        temp_file = tempfile.NamedTemporaryFile(delete=False)
+        temp_file.close()
+        with ATCWriter(temp_file.name) as writer:
+            writer.write_header('DATE_RECORDED', 'UUID_123', '', 'ATCFilterTest', 'TestWritesFile', '', '',
+                                reader.flags(), reader.sample_rate_hz(), reader.mains_frequency_hz(),
+                                ecg_filter=ecg_filter)
+            writer.write_ecg_samples(reader.get_ecg_samples(1), 1)
+        saved_atc_file = ATCReader(temp_file.name)
+        os.unlink(temp_file.name)
+        self.assertEqual(saved_atc_file.status(), atc_reader.READ_SUCCESS)
+        self.assertTrue(saved_atc_file.baseline_filtered())
+        self.assertTrue(saved_atc_file.notch_mains_filtered())
+        self.assertEqual(saved_atc_file.mains_frequency_hz(), reader.mains_frequency_hz())
+        self.assertListEqual(saved_atc_file.get_ecg_samples(1), ecg_filter.apply_atc(reader.get_ecg_samples(1)))
+        # Filters already applied are not applied again.
+        np.testing.assert_array_equal(saved_atc_file.get_filtered_ecg_samples(1), saved_atc_file.get_ecg_samples(1))
+
+    def test_writer_rejects_mismatched_filter(self):
+        with io.BytesIO() as f:
+            writer = ATCWriter(f)
+            with self.assertRaises(ValueError):
+                writer.write_header('DATE_RECORDED', 'UUID_123', '', '', '', '', '', {}, 300, 50,
+                                    ecg_filter=ECGFilter(300, 60))
+            with self.assertRaises(ValueError):
+                writer.write_header('DATE_RECORDED', 'UUID_123', '', '', '', '', '', {}, 500, 60,
+                                    ecg_filter=ECGFilter(300, 60))
+            self.assertEqual(f.tell(), 0)
+            # The mains frequency does not matter without the notch filter.
+            self.assertTrue(writer.write_header('DATE_RECORDED', 'UUID_123', '', '', '', '', '', {}, 300, 50,
+                                                ecg_filter=ECGFilter(300, 60, notch=False)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+"""Content hashes of ATC sample blocks, used to fingerprint recordings independently of their info block."""
+import hashlib
+
+from atc import atc_file_structure as afs
+
+
+DIGEST_SIZE = 16  # Bytes
+
+# Sample blocks covered by the recording fingerprint, in the order they are combined.
+sample_block_ids = ['pre '] + afs.lead_ids + afs.avg_ids
+
+
+def block_hasher():
+    """A new hash object for the sample bytes of one block."""
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def recording_fingerprint(block_hashes):
+    """Combines sample block hashes into a recording fingerprint.
+
+       Args:
+         block_hashes (dict) Hex digest of each sample block, keyed by block ID.
+       Returns: (str) Hex digest of the recording, or None if it has no sample blocks.
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    hashed = False
+    for block_id in sample_block_ids:
+        if block_id in block_hashes:
+            h.update(block_id.encode('ascii'))
+            h.update(bytes.fromhex(block_hashes[block_id]))
+            hashed = True
+    return h.hexdigest() if hashed else None
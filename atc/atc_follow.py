@@ -0,0 +1,223 @@
+"""ATCFollowReader parses an ATC file incrementally while it is still being written."""
+import os
+import struct
+import time
+
+from atc import atc_file_structure as afs
+from atc import atc_fingerprint
+from atc import atc_reader
+from atc.atc_reader import ATCReader
+
+
+# Blocks containing int16 samples, which are decoded as they grow.
+_sample_block_ids = [b'pre '] + [i.encode('ascii') for i in afs.lead_ids + afs.avg_ids]
+
+
+class ATCFollowReader(ATCReader):
+    """Follows an ATC file while a recorder is writing it.
+
+       Each poll reads only the bytes appended since the previous poll.  Sample blocks are decoded as their bytes
+       land, so new ECG samples are available before the block's checksum is written.  All other blocks are parsed
+       once complete.  Parsed data accumulates in self.dict, so the ATCReader accessors work on the data read so far.
+    """
+    def __init__(self, path_or_file, fingerprint=False):
+        """Opens an ATC file to follow.
+
+           Args:
+             path_or_file (str/file) Path of the ATC file, or a binary file object.
+             fingerprint (bool) Hash the content of each sample block as it is read.
+        """
+        self.dict = {}
+        self.__status = atc_reader.READ_SUCCESS
+        self.__fingerprint = fingerprint
+        self.__f = None
+        self.__owns_file = False
+        self.__buffer = bytearray()  # Bytes read from the file but not yet parsed.
+        self.__offset = 0            # File offset of the first byte in __buffer.
+        self.__block_id = None       # ID of the sample block in progress, or None between blocks.
+        self.__block_length = 0
+        self.__block_checksum = 0
+        self.__block_hasher = None
+        self.__completed_blocks = set()
+        if isinstance(path_or_file, str):
+            if not os.path.exists(path_or_file):
+                self.__status = atc_reader.NO_FILE
+                return
+            self.__f = open(path_or_file, 'rb')
+            self.__owns_file = True
+        else:
+            self.__f = path_or_file
+
+    def close(self):
+        if self.__owns_file and self.__f is not None:
+            self.__f.close()
+        self.__f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def status(self):
+        return self.__status
+
+    def offset(self):
+        """File offset up to which the file has been parsed."""
+        return self.__offset
+
+    def progress(self):
+        """Progress of the sample block currently being written.
+
+           Returns: (block_id, bytes_parsed, data_length), or None if the reader is between blocks.
+        """
+        if self.__block_id is None:
+            return None
+        block_id_str = self.__block_id.decode('ascii')
+        return block_id_str, len(self.dict[block_id_str]['data']) * 2, self.__block_length
+
+    def block_complete(self, block_id):
+        """Has the checksum of the specified block (e.g. 'ann ') been read and verified."""
+        return block_id in self.__completed_blocks
+
+    def poll(self):
+        """Reads and parses any bytes appended to the file since the last poll.
+
+           Returns: (dict) The new samples of each ECG lead which grew, keyed by lead index (1 = lead I).
+        """
+        new_samples = {}
+        if self.__f is None or self.__status != atc_reader.READ_SUCCESS:
+            return new_samples
+        data = self.__f.read()
+        if data:
+            self.__buffer += data
+        while self.__status == atc_reader.READ_SUCCESS and self.__parse_next(new_samples):
+            pass
+        return new_samples
+
+    def follow(self, poll_interval_s=0.1, idle_timeout_s=5.0, final_block_id=None):
+        """Polls the file until the recording is complete, yielding new samples as they are written.
+
+           Following finishes once the checksum of final_block_id is verified or, if final_block_id is None, once the
+           reader is between blocks and the file has not grown for idle_timeout_s.  If the file stops growing part way
+           through a block, or has no format block when following finishes, status() becomes MISSING_DATA.
+
+           Args:
+             poll_interval_s (float) Delay between polls, in seconds.
+             idle_timeout_s (float) Give up after the file has not grown for this long, in seconds.
+             final_block_id (str) The ID of the last block the recorder writes, i.e. 'ann '.
+           Yields: (dict) The new samples of each ECG lead, as returned by poll().
+        """
+        last_growth = time.monotonic()
+        while self.__status == atc_reader.READ_SUCCESS:
+            bytes_read = self.__offset + len(self.__buffer)
+            new_samples = self.poll()
+            if new_samples:
+                yield new_samples
+            if final_block_id is not None and self.block_complete(final_block_id):
+                break
+            now = time.monotonic()
+            if self.__offset + len(self.__buffer) > bytes_read:
+                last_growth = now
+            elif now - last_growth >= idle_timeout_s:
+                if self.__block_id is not None or self.__buffer or 'header' not in self.dict:
+                    self.__status = atc_reader.MISSING_DATA
+                break
+            time.sleep(poll_interval_s)
+        if self.__status == atc_reader.READ_SUCCESS and afs.format_block_id not in self.dict:
+            self.__status = atc_reader.MISSING_DATA
+
+    def __consume(self, n):
+        del self.__buffer[:n]
+        self.__offset += n
+
+    def __parse_next(self, new_samples):
+        """Parses the next complete unit (header, block, or run of samples) from the buffer.
+
+           Returns: True if anything was parsed, False if more bytes are needed or parsing failed.
+        """
+        if 'header' not in self.dict:
+            return self.__parse_header()
+        if self.__block_id is not None:
+            return self.__parse_samples(new_samples)
+        if len(self.__buffer) < afs.block_prefix_size:
+            return False
+        block_id = bytes(self.__buffer[:afs.atc_block_id_len])
+        try:
+            block_id_str = block_id.decode('ascii')
+        except UnicodeDecodeError:
+            self.__status = atc_reader.MISSING_DATA
+            return False
+        data_length = struct.unpack(afs.endianness + 'I', self.__buffer[afs.atc_block_id_len:afs.block_prefix_size])[0]
+        if block_id in _sample_block_ids:
+            self.__block_id = block_id
+            self.__block_length = data_length
+            self.__block_checksum = sum(self.__buffer[:afs.block_prefix_size])
+            self.__block_hasher = atc_fingerprint.block_hasher() if self.__fingerprint else None
+            self.dict[block_id_str] = {'data_length': data_length, 'data': []}
+            self.__consume(afs.block_prefix_size)
+            return True
+        block_size = afs.block_container_size + data_length
+        if len(self.__buffer) < block_size:
+            return False
+        if block_id in dict(afs.block_types):
+            try:
+                x, _, chksum_ok = atc_reader._parse_atc_block(
+                        bytes(self.__buffer[afs.atc_block_id_len:block_size]), block_id)
+            except Exception as e:
+                self.__status = atc_reader.MISSING_DATA
+                return False
+            if not chksum_ok:
+                self.__status = atc_reader.CORRUPT_DATA
+                return False
+            self.dict[block_id_str] = x
+            self.__completed_blocks.add(block_id_str)
+        else:
+            print('Warning: Unknown ATC block ID %s at byte position %d, ignoring' % (block_id_str, self.__offset))
+        self.__consume(block_size)
+        return True
+
+    def __parse_header(self):
+        if len(self.__buffer) < afs.header_size:
+            return False
+        try:
+            header, n, status = atc_reader._parse_atc_header(bytes(self.__buffer[:afs.header_size]))
+        except Exception as e:
+            status = atc_reader.NO_ATC_SIGNATURE
+        if status != atc_reader.READ_SUCCESS:
+            self.__status = status
+            return False
+        self.dict['header'] = header
+        self.__consume(n)
+        return True
+
+    def __parse_samples(self, new_samples):
+        block_id_str = self.__block_id.decode('ascii')
+        block = self.dict[block_id_str]
+        remaining = self.__block_length // 2 - len(block['data'])
+        if remaining > 0:
+            n = min(remaining, len(self.__buffer) // 2)
+            if n == 0:
+                return False
+            raw = bytes(self.__buffer[:n * 2])
+            samples = list(struct.unpack(afs.endianness + '%dh' % n, raw))
+            block['data'].extend(samples)
+            self.__block_checksum += sum(raw)
+            if self.__block_hasher is not None:
+                self.__block_hasher.update(raw)
+            if block_id_str in afs.lead_ids:
+                new_samples.setdefault(afs.lead_ids.index(block_id_str) + 1, []).extend(samples)
+            self.__consume(n * 2)
+            return True
+        if len(self.__buffer) < 4:
+            return False
+        block['checksum'] = struct.unpack(afs.endianness + 'I', self.__buffer[:4])[0]
+        self.__consume(4)
+        self.__block_id = None
+        if block['checksum'] != self.__block_checksum:
+            self.__status = atc_reader.CORRUPT_DATA
+            return False
+        if self.__block_hasher is not None:
+            block['hash'] = self.__block_hasher.hexdigest()
+        self.__completed_blocks.add(block_id_str)
+        return True
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+from atc import atc_reader
+from atc.atc_follow import ATCFollowReader
+from atc.atc_reader import ATCReader
+
+
+def _write_in_chunks(source, destination, chunk_size, delay_s):
+    """Copies source to destination a chunk at a time, as a recorder writing a file would."""
+    with open(source, 'rb') as f:
+        data = f.read()
+    with open(destination, 'ab') as f:
+        for i in range(0, len(data), chunk_size):
+            f.write(data[i:i + chunk_size])
+            f.flush()
+            time.sleep(delay_s)
+
+
+class TestATCFollowReader(unittest.TestCase):
+
+    def setUp(self):
+        temp_file = tempfile.NamedTemporaryFile(delete=False)
+        temp_file.close()
+        self.temp_file_name = temp_file.name
+
+    def tearDown(self):
+        os.unlink(self.temp_file_name)
+
+    def test_nonexistent_file(self):
+        follower = ATCFollowReader('nonexistent_file.atc')
+        self.assertEqual(follower.status(), atc_reader.NO_FILE)
+        self.assertEqual(follower.poll(), {})
+
+    def test_parses_incremental_writes(self):
+        with open('atc/test_data/6_lead_ab.atc', 'rb') as f:
+            atc_bytes = f.read()
+        samples = {}
+        with open(self.temp_file_name, 'wb') as w, ATCFollowReader(self.temp_file_name, fingerprint=True) as follower:
+            for i in range(0, len(atc_bytes), 1001):
+                w.write(atc_bytes[i:i + 1001])
+                w.flush()
+                for lead, new_samples in follower.poll().items():
+                    samples.setdefault(lead, []).extend(new_samples)
+                self.assertEqual(follower.status(), atc_reader.READ_SUCCESS)
+            self.assertEqual(follower.offset(), len(atc_bytes))
+            self.assertIsNone(follower.progress())
+        reader = ATCReader('atc/test_data/6_lead_ab.atc', fingerprint=True)
+        self.assertEqual(follower.num_leads(), 6)
+        self.assertEqual(follower.fingerprint(), reader.fingerprint())
+        for lead in range(1, 7):
+            self.assertListEqual(samples[lead], reader.get_ecg_samples(lead))
+            self.assertListEqual(follower.get_ecg_samples(lead), reader.get_ecg_samples(lead))
+        self.assertListEqual(follower.get_average_beat(1), reader.get_average_beat(1))
+        self.assertEqual(follower.get_annotations(), reader.get_annotations())
+        self.assertEqual(follower.sample_rate_hz(), reader.sample_rate_hz())
+        self.assertEqual(follower.recording_uuid(), reader.recording_uuid())
+
+    def test_reports_block_progress(self):
+        # ECG data block of this file starts at 308, length 18000.
+        with open('atc/test_data/1_lead.atc', 'rb') as f:
+            atc_bytes = f.read()
+        with open(self.temp_file_name, 'wb') as w, ATCFollowReader(self.temp_file_name) as follower:
+            w.write(atc_bytes[:308 + 8 + 101])
+            w.flush()
+            new_samples = follower.poll()
+            self.assertEqual(len(new_samples[1]), 50)
+            self.assertEqual(follower.progress(), ('ecg ', 100, 18000))
+            self.assertFalse(follower.block_complete('ecg '))
+            w.write(atc_bytes[308 + 8 + 101:308 + 18012])
+            w.flush()
+            new_samples = follower.poll()
+            self.assertEqual(len(new_samples[1]), 8950)
+            self.assertIsNone(follower.progress())
+            self.assertTrue(follower.block_complete('ecg '))
+            self.assertEqual(follower.poll(), {})
+        self.assertEqual(follower.status(), atc_reader.READ_SUCCESS)
+
+    def test_detects_broken_checksum(self):
+        with open('atc/test_data/broken_checksum.atc', 'rb') as f:
+            atc_bytes = f.read()
+        with open(self.temp_file_name, 'wb') as w, ATCFollowReader(self.temp_file_name) as follower:
+            w.write(atc_bytes)
+            w.flush()
+            follower.poll()
+        self.assertEqual(follower.status(), atc_reader.CORRUPT_DATA)
+
+    def test_follows_writer_process(self):
+        writer = multiprocessing.Process(
+                target=_write_in_chunks, args=('atc/test_data/6_lead.atc', self.temp_file_name, 4096, 0.01))
+        writer.start()
+        samples = {}
+        with ATCFollowReader(self.temp_file_name) as follower:
+            for new_samples in follower.follow(poll_interval_s=0.005, idle_timeout_s=10.0, final_block_id='ann '):
+                for lead, s in new_samples.items():
+                    samples.setdefault(lead, []).extend(s)
+        writer.join()
+        self.assertEqual(follower.status(), atc_reader.READ_SUCCESS)
+        reader = ATCReader('atc/test_data/6_lead.atc')
+        for lead in range(1, 7):
+            self.assertListEqual(samples[lead], reader.get_ecg_samples(lead))
+        self.assertEqual(follower.get_annotations(), reader.get_annotations())
+
+    def test_follow_stops_on_truncated_block(self):
+        with open('atc/test_data/1_lead.atc', 'rb') as f:
+            atc_bytes = f.read()
+        with open(self.temp_file_name, 'wb') as w:
+            w.write(atc_bytes[:1000])
+        with ATCFollowReader(self.temp_file_name) as follower:
+            list(follower.follow(poll_interval_s=0.01, idle_timeout_s=0.05))
+        self.assertEqual(follower.status(), atc_reader.MISSING_DATA)
+
+
+if __name__ == '__main__':
+    unittest.main()
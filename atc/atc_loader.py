@@ -0,0 +1,184 @@
+"""ATCWindowLoader yields batches of fixed-length sample windows drawn from a corpus of ATC files."""
+import collections
+from concurrent import futures
+import os
+import time
+
+import numpy as np
+
+from atc import atc_file_structure as afs
+from atc import atc_reader
+
+
+def _read_lead_table(path):
+    """Locates the ECG lead blocks of an ATC file without reading their samples.
+
+       Returns: ({lead: (file offset of first sample, number of samples)}, status).
+    """
+    if not os.path.exists(path):
+        return {}, atc_reader.NO_FILE
+    with open(path, 'rb') as f:
+        blocks, status = atc_reader._read_block_table(f, os.fstat(f.fileno()).st_size)
+    leads = {}
+    for (block_id, offset, size) in blocks:
+        block_id_str = block_id.decode('ascii', 'replace')
+        if block_id_str in afs.lead_ids:
+            leads[afs.lead_ids.index(block_id_str) + 1] = \
+                    (offset + afs.block_prefix_size, (size - afs.block_container_size) // 2)
+    return leads, status
+
+
+def _load_windows(requests, window, dtype):
+    """Reads the samples of each window directly from its lead blocks.
+
+       Args:
+         requests ([(path, [offset], start)]) For each window, the file, the offset of each lead's first sample,
+                                              and the index of the window's first sample.
+       Returns: (np.ndarray) Samples with shape (len(requests), leads, window).
+    """
+    num_leads = len(requests[0][1]) if requests else 0
+    batch = np.empty((len(requests), num_leads, window), dtype=dtype)
+    f, f_path = None, None
+    try:
+        for i, (path, offsets, start) in enumerate(requests):
+            if path != f_path:
+                if f is not None:
+                    f.close()
+                f, f_path = open(path, 'rb'), path
+            for j, offset in enumerate(offsets):
+                f.seek(offset + start * 2)
+                batch[i, j] = np.frombuffer(f.read(window * 2), dtype=afs.endianness + 'i2')
+    finally:
+        if f is not None:
+            f.close()
+    return batch
+
+
+class ATCWindowLoader:
+    """Iterates over shuffled batches of fixed-length windows of ECG samples from many ATC files.
+
+       On construction, the lead blocks of every file are located by reading block headers only, and every window
+       position in the corpus is indexed.  Each iteration is one epoch over the index, shuffled with a seed derived
+       from seed and the epoch number.  Batches are read by a pool of worker threads or processes, which read only
+       the bytes of the windows in the batch and run up to prefetch batches ahead of the consumer.
+
+       Samples are read without verifying block checksums.  Files which cannot be read, or which lack one of the
+       requested leads, are skipped and listed by skipped_files().
+    """
+    def __init__(self, paths, window, batch_size, leads=(1,), stride=None, seed=0, shuffle=True, drop_last=False,
+                 workers=4, processes=False, prefetch=8, dtype=np.float32):
+        """Indexes the windows of a corpus.
+
+           Args:
+             paths (str/[str]) A directory to search for .atc files, or a list of ATC file paths.
+             window (int) The number of samples in each window.
+             batch_size (int) The number of windows in each batch.
+             leads ([int]) The leads to read, 1 = lead I, 2 = lead II.
+             stride (int) The number of samples between consecutive window positions.  Defaults to window.
+             seed (int) Seed of the shuffle order.
+             shuffle (bool) Shuffle windows across the corpus.  If False windows are read in file order.
+             drop_last (bool) Drop the final batch of each epoch if it has fewer than batch_size windows.
+             workers (int) The number of worker threads or processes.
+             processes (bool) Use worker processes instead of threads.
+             prefetch (int) The maximum number of batches read ahead of the consumer.
+             dtype (np.dtype) The dtype of the yielded arrays.
+        """
+        if isinstance(paths, str):
+            directory, paths = paths, []
+            for root, _, file_names in os.walk(directory):
+                paths += [os.path.join(root, file_name) for file_name in file_names if file_name.endswith('.atc')]
+            paths.sort()
+        self.__window = window
+        self.__batch_size = batch_size
+        self.__leads = list(leads)
+        self.__stride = stride or window
+        self.__seed = seed
+        self.__shuffle = shuffle
+        self.__drop_last = drop_last
+        self.__workers = workers
+        self.__processes = processes
+        self.__prefetch = prefetch
+        self.__dtype = dtype
+        self.__epoch = 0
+        self.__stats = {'batches': 0, 'windows': 0, 'seconds': 0.0, 'wait_seconds': 0.0}
+        self.__iteration_start = None  # Start time of the iteration in progress, if any.
+        self.__files, self.__skipped = [], []
+        file_indices, starts = [], []
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, (lead_table, status) in zip(paths, executor.map(_read_lead_table, paths)):
+                if status != atc_reader.READ_SUCCESS or not all(l in lead_table for l in self.__leads):
+                    self.__skipped.append(path)
+                    continue
+                num_samples = min(lead_table[l][1] for l in self.__leads)
+                num_windows = max(0, (num_samples - window) // self.__stride + 1)
+                if num_windows:
+                    file_indices.append(np.full(num_windows, len(self.__files)))
+                    starts.append(np.arange(num_windows) * self.__stride)
+                self.__files.append((path, [lead_table[l][0] for l in self.__leads]))
+        self.__index_files = np.concatenate(file_indices) if file_indices else np.zeros(0, dtype=int)
+        self.__index_starts = np.concatenate(starts) if starts else np.zeros(0, dtype=int)
+
+    def __len__(self):
+        """The number of batches in each epoch."""
+        if self.__drop_last:
+            return self.num_windows() // self.__batch_size
+        return -(-self.num_windows() // self.__batch_size)
+
+    def num_windows(self):
+        """The number of windows in the corpus."""
+        return len(self.__index_starts)
+
+    def skipped_files(self):
+        """Paths of files which were not indexed."""
+        return list(self.__skipped)
+
+    def set_epoch(self, epoch):
+        """Sets the epoch used to seed the shuffle order of the next iteration."""
+        self.__epoch = epoch
+
+    def stats(self):
+        """Loader throughput, accumulated over all iterations including the one in progress.
+
+           Returns: (dict) batches and windows yielded, seconds spent iterating, windows_per_second, and
+                    wait_seconds spent waiting for workers.  If wait_seconds is a large fraction of seconds, the
+                    consumer is starved and more workers or a larger prefetch may help.
+        """
+        stats = dict(self.__stats)
+        if self.__iteration_start is not None:
+            stats['seconds'] += time.monotonic() - self.__iteration_start
+        stats['windows_per_second'] = stats['windows'] / stats['seconds'] if stats['seconds'] else 0.0
+        return stats
+
+    def __iter__(self):
+        order = np.arange(self.num_windows())
+        if self.__shuffle:
+            np.random.RandomState([self.__seed, self.__epoch]).shuffle(order)
+        self.__epoch += 1
+        batches = [order[i:i + self.__batch_size] for i in range(0, len(order), self.__batch_size)]
+        if self.__drop_last and batches and len(batches[-1]) < self.__batch_size:
+            batches.pop()
+        executor_class = futures.ProcessPoolExecutor if self.__processes else futures.ThreadPoolExecutor
+        pending = collections.deque()
+        self.__iteration_start = time.monotonic()
+        with executor_class(max_workers=self.__workers) as executor:
+            try:
+                for batch in batches:
+                    if len(pending) >= self.__prefetch:
+                        yield self.__next_batch(pending)
+                    requests = [self.__files[self.__index_files[i]] + (int(self.__index_starts[i]),) for i in batch]
+                    pending.append(executor.submit(_load_windows, requests, self.__window, self.__dtype))
+                while pending:
+                    yield self.__next_batch(pending)
+            finally:
+                for future in pending:
+                    future.cancel()
+                self.__stats['seconds'] += time.monotonic() - self.__iteration_start
+                self.__iteration_start = None
+
+    def __next_batch(self, pending):
+        wait_start = time.monotonic()
+        batch = pending.popleft().result()
+        self.__stats['wait_seconds'] += time.monotonic() - wait_start
+        self.__stats['batches'] += 1
+        self.__stats['windows'] += len(batch)
+        return batch
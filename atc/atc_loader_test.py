@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from atc.atc_loader import ATCWindowLoader
+from atc.atc_reader import ATCReader
+
+
+class TestATCWindowLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.temp_dir, 'nested'))
+        shutil.copy('atc/test_data/1_lead.atc', self.temp_dir)
+        shutil.copy('atc/test_data/6_lead.atc', os.path.join(self.temp_dir, 'nested'))
+        shutil.copy('atc/test_data/6_lead_ab.atc', os.path.join(self.temp_dir, 'nested'))
+        with open(os.path.join(self.temp_dir, 'truncated.atc'), 'wb') as f:
+            with open('atc/test_data/6_lead.atc', 'rb') as src:
+                f.write(src.read(1000))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertWindowsMatchReader(self, batches, paths, leads, window):
+        samples = {}
+        for path in paths:
+            reader = ATCReader(path)
+            samples[path] = np.array([reader.get_ecg_samples(l) for l in leads])
+        windows = np.concatenate(batches)
+        expected = []
+        for path in paths:
+            for start in range(0, samples[path].shape[1] - window + 1, window):
+                expected.append(samples[path][:, start:start + window])
+        self.assertEqual(len(windows), len(expected))
+        # Every window in the corpus is yielded exactly once per epoch.
+        key = lambda w: w.tobytes()
+        self.assertListEqual(sorted(map(key, windows)), sorted(map(key, np.array(expected, dtype=windows.dtype))))
+
+    def test_yields_every_window_once(self):
+        loader = ATCWindowLoader(self.temp_dir, window=1000, batch_size=7, leads=(1,), workers=2, prefetch=2)
+        self.assertListEqual(loader.skipped_files(), [os.path.join(self.temp_dir, 'truncated.atc')])
+        self.assertEqual(loader.num_windows(), 9 + 2 * 9)
+        self.assertEqual(len(loader), 4)
+        batches = list(loader)
+        self.assertEqual([b.shape for b in batches], [(7, 1, 1000)] * 3 + [(6, 1, 1000)])
+        self.assertEqual(batches[0].dtype, np.float32)
+        self.assertWindowsMatchReader(batches, [os.path.join(self.temp_dir, '1_lead.atc'),
+                                                os.path.join(self.temp_dir, 'nested', '6_lead.atc'),
+                                                os.path.join(self.temp_dir, 'nested', '6_lead_ab.atc')], [1], 1000)
+        stats = loader.stats()
+        self.assertEqual(stats['batches'], 4)
+        self.assertEqual(stats['windows'], 27)
+        self.assertGreater(stats['windows_per_second'], 0)
+
+    def test_reports_stats_during_epoch(self):
+        loader = ATCWindowLoader(self.temp_dir, window=100, batch_size=10, workers=2, prefetch=2)
+        epoch = iter(loader)
+        for _ in range(10):
+            next(epoch)
+        stats = loader.stats()
+        self.assertEqual(stats['batches'], 10)
+        self.assertEqual(stats['windows'], 100)
+        self.assertGreater(stats['seconds'], 0)
+        self.assertGreater(stats['windows_per_second'], 0)
+        list(epoch)
+        seconds = loader.stats()['seconds']
+        # During the next epoch, time spent in it counts towards the rate.
+        epoch = iter(loader)
+        next(epoch)
+        time.sleep(0.1)
+        stats = loader.stats()
+        self.assertGreaterEqual(stats['seconds'], seconds + 0.1)
+        self.assertAlmostEqual(stats['windows_per_second'], stats['windows'] / stats['seconds'], delta=1.0)
+        epoch.close()
+        self.assertGreaterEqual(loader.stats()['seconds'], seconds + 0.1)
+
+    def test_reads_multiple_leads_in_processes(self):
+        paths = [os.path.join(self.temp_dir, 'nested', '6_lead.atc'), os.path.join(self.temp_dir, '1_lead.atc')]
+        loader = ATCWindowLoader(paths, window=500, batch_size=16, leads=(2, 6), stride=500, processes=True,
+                                 workers=2, drop_last=True, dtype=np.int16)
+        self.assertListEqual(loader.skipped_files(), [os.path.join(self.temp_dir, '1_lead.atc')])
+        batches = list(loader)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].shape, (16, 2, 500))
+        reader = ATCReader(paths[0])
+        expected = {np.array([reader.get_ecg_samples(2)[s:s + 500], reader.get_ecg_samples(6)[s:s + 500]],
+                             dtype=np.int16).tobytes() for s in range(0, 9000, 500)}
+        for w in batches[0]:
+            self.assertIn(w.tobytes(), expected)
+
+    def test_shuffle_is_deterministic(self):
+        first = np.concatenate(list(ATCWindowLoader(self.temp_dir, window=300, batch_size=10, seed=3)))
+        second_loader = ATCWindowLoader(self.temp_dir, window=300, batch_size=10, seed=3)
+        second = np.concatenate(list(second_loader))
+        np.testing.assert_array_equal(first, second)
+        # The next epoch is shuffled differently.
+        self.assertFalse(np.array_equal(np.concatenate(list(second_loader)), first))
+        second_loader.set_epoch(0)
+        np.testing.assert_array_equal(np.concatenate(list(second_loader)), first)
+        unshuffled = np.concatenate(list(ATCWindowLoader(self.temp_dir, window=300, batch_size=10, shuffle=False)))
+        np.testing.assert_array_equal(unshuffled[0, 0], ATCReader(os.path.join(self.temp_dir, '1_lead.atc'))
+                                      .get_ecg_samples(1)[:300])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ import os
 import struct
 
 from atc import atc_file_structure as afs
+from atc import atc_fingerprint
 
 
 # Reader status codes
@@ -40,9 +41,123 @@ def _decode_flags(flag_byte):
     return flags
 
 
+def _parse_atc_block(data, block_id, hasher=None):
+    byte_idx, parsed_block = 0, {}
+    computed_checksum = sum(bytearray(block_id))
+    block_id_str = block_id.decode('ascii')
+    # Read in all data fields for this block
+    for (var_name, type_str) in dict(afs.block_types)[block_id]:
+        format_str = afs.endianness + type_str
+        parsed_block[var_name] = []
+        if var_name == 'data':
+            if block_id_str in (['pre '] + afs.lead_ids + afs.avg_ids):
+                N = int(parsed_block['data_length'] / 2)
+                parsed_block[var_name], byte_idx, computed_checksum = \
+                        _parse_atc_data_block(data, format_str, N, byte_idx, computed_checksum, hasher)
+                if hasher is not None:
+                    parsed_block['hash'] = hasher.hexdigest()
+            else:
+                print('Warning: unknown atc data block ID: {0}'.format(block_id_str))
+        elif var_name == 'annotations':
+            if block_id_str == 'ann ':
+                N = int((parsed_block['data_length'] - 4) / 6)
+                parsed_block[var_name], byte_idx, computed_checksum = \
+                        _parse_atc_annotation_block(data, format_str, N, byte_idx, computed_checksum)
+            else:
+                print('Warning: unknown atc annotation block ID: {0}'.format(block_id_str))
+        else:
+            var_size = struct.calcsize(format_str)
+            x = struct.unpack(format_str, data[byte_idx:byte_idx+var_size])[0]
+            parsed_block[var_name] = x
+
+            if var_name != 'checksum':
+                # Updates checksum computation for this block
+                computed_checksum += sum(bytearray(
+                        data[byte_idx:byte_idx + var_size]))
+
+            if format_str[-1] == 's':
+                # Decodes any strings and strip out trailing NULLs
+                parsed_block[var_name] = parsed_block[var_name].decode('ascii')
+                parsed_block[var_name] = parsed_block[var_name].rstrip('\0')
+                parsed_block[var_name] = str(parsed_block[var_name])
+
+            if var_name == 'flags':
+                parsed_block[var_name] = _decode_flags(parsed_block[var_name])
+
+            byte_idx += var_size
+    chksum_ok = parsed_block['checksum'] == computed_checksum
+    return parsed_block, byte_idx, chksum_ok
+
+
+def _parse_atc_data_block(data, format_str, N, byte_idx, computed_checksum, hasher=None):
+    parsed_data = []
+    start_idx = byte_idx
+    var_size = struct.calcsize(format_str)
+    for n in range(0, N):
+        x = struct.unpack(format_str, data[byte_idx:byte_idx + var_size])
+        if len(x) == 1:
+            parsed_data.append(x[0])
+        else:
+            parsed_data.append(x)
+        computed_checksum += sum(bytearray(data[byte_idx:byte_idx + var_size]))
+        byte_idx += var_size
+    if hasher is not None:
+        hasher.update(data[start_idx:byte_idx])
+    return parsed_data, byte_idx, computed_checksum
+
+
+def _parse_atc_annotation_block(data, format_str, N, byte_idx, computed_checksum):
+    parsed_data = []
+    var_size = struct.calcsize(format_str)
+    for n in range(0, N):
+        x = struct.unpack(format_str, data[byte_idx:byte_idx + var_size])
+        if len(x) == 2:
+            parsed_data.append(x)
+        computed_checksum += sum(bytearray(data[byte_idx:byte_idx + var_size]))
+        byte_idx += var_size
+    return parsed_data, byte_idx, computed_checksum
+
+
+def _read_block_table(f, file_size):
+    """Reads the header and the ID and length of each block, without reading block contents.
+
+       Returns: ([(block_id, offset, size)], status) The ID, file offset and total size of each block.
+    """
+    header = f.read(afs.header_size)
+    try:
+        _, _, status = _parse_atc_header(header)
+    except Exception as e:
+        status = NO_ATC_SIGNATURE
+    if status != READ_SUCCESS:
+        return [], status
+    blocks = []
+    offset = afs.header_size
+    while offset < file_size:
+        f.seek(offset)
+        prefix = f.read(afs.block_prefix_size)
+        if len(prefix) < afs.block_prefix_size:
+            return blocks, MISSING_DATA
+        data_length = struct.unpack(afs.endianness + 'I', prefix[afs.atc_block_id_len:])[0]
+        size = afs.block_container_size + data_length
+        if offset + size > file_size:
+            return blocks, MISSING_DATA
+        blocks.append((prefix[:afs.atc_block_id_len], offset, size))
+        offset += size
+    if afs.format_block_id.encode('ascii') not in [b[0] for b in blocks]:
+        return blocks, MISSING_DATA
+    return blocks, READ_SUCCESS
+
+
 class ATCReader:
-    def __init__(self, path_or_file):
+    def __init__(self, path_or_file, fingerprint=False):
+        """Reads and parses an ATC file.
+
+           Args:
+             path_or_file (str/file) Path of the ATC file, or a binary file object.
+             fingerprint (bool) Hash the content of each sample block while parsing it.
+        """
         self.__status = READ_SUCCESS
+        self.__fingerprint = fingerprint
         data = None
         if isinstance(path_or_file, str):
             if not os.path.exists(path_or_file):
@@ -73,6 +188,24 @@ class ATCReader:
         block_id = afs.lead_ids[lead - 1]
         return self.dict[block_id]['data']
 
+    def get_filtered_ecg_samples(self, lead, baseline=True, notch=True):
+        """Get ECG samples for specified lead, filtered with atc_filter.ECGFilter.  Requires numpy.
+
+           Filters which the flags show were already applied to the recording are skipped.  The notch filter is also
+           skipped for recordings which were mains filtered.
+        Args:
+            lead (int) The index of the lead. 1 = lead I, 2 = leadII
+            baseline (bool) Apply the baseline filter.
+            notch (bool) Apply the mains notch filter.
+        Returns: (np.ndarray) The filtered samples, in ATC units.
+        """
+        from atc import atc_filter  # Imported here so that reading ATC files does not require numpy.
+        ecg_filter = atc_filter.ECGFilter(
+                self.sample_rate_hz(), self.mains_frequency_hz(),
+                baseline=baseline and not self.baseline_filtered(),
+                notch=notch and not (self.notch_mains_filtered() or self.mains_filtered()))
+        return ecg_filter.apply(self.get_ecg_samples(lead))
+
     def get_average_beat(self, lead):
         """Get the average beat for specified lead.
         Args:
@@ -148,6 +281,19 @@ class ATCReader:
         """The recorder device data, which is a comma-separated string of key-value pairs specific to the device."""
         return self.dict['info']['device_data']
 
+    def block_hash(self, block_id):
+        """Hex digest of the samples in a block, i.e. 'ecg ', if the file was read with fingerprint=True."""
+        return self.dict[block_id].get('hash')
+
+    def fingerprint(self):
+        """Fingerprint of the recording's sample blocks, if the file was read with fingerprint=True.
+
+           The info and annotation blocks are not included, so copies of a recording with a different recording_uuid
+           have the same fingerprint.
+        """
+        return atc_fingerprint.recording_fingerprint(
+                {k: v['hash'] for (k, v) in self.dict.items() if k in atc_fingerprint.sample_block_ids and 'hash' in v})
+
     def __parse_atc_data(self, data):
         """Parse an ATC file from a binary string."""
         num_of_bytes = len(data)  # file size in bytes
@@ -176,7 +322,8 @@ class ATCReader:
 
             if block_id in dict(afs.block_types):
                 try:
-                    x, N, chksum_ok = self.__parse_atc_block(data[bytes_read:], block_id)
+                    hasher = atc_fingerprint.block_hasher() if self.__fingerprint else None
+                    x, N, chksum_ok = _parse_atc_block(data[bytes_read:], block_id, hasher)
                     parsed_data[block_id_str] = x
                     bytes_read += N
                 except Exception as e:
@@ -192,72 +339,3 @@ class ATCReader:
             self.__status = MISSING_DATA
             return None
         return parsed_data
-
-    def __parse_atc_block(self, data, block_id):
-        byte_idx, parsed_block = 0, {}
-        computed_checksum = sum(bytearray(block_id))
-        block_id_str = block_id.decode('ascii')
-        # Read in all data fields for this block
-        for (var_name, type_str) in dict(afs.block_types)[block_id]:
-            format_str = afs.endianness + type_str
-            parsed_block[var_name] = []
-            if var_name == 'data':
-                if block_id_str in (['pre '] + afs.lead_ids + afs.avg_ids):
-                    N = int(parsed_block['data_length'] / 2)
-                    parsed_block[var_name], byte_idx, computed_checksum = \
-                            self.__parse_atc_data_block(data, format_str, N, byte_idx, computed_checksum)
-                else:
-                    print('Warning: unknown atc data block ID: {0}'.format(block_id_str))
-            elif var_name == 'annotations':
-                if block_id_str == 'ann ':
-                    N = int((parsed_block['data_length'] - 4) / 6)
-                    parsed_block[var_name], byte_idx, computed_checksum = \
-                            self.__parse_atc_annotation_block(data, format_str, N, byte_idx, computed_checksum)
-                else:
-                    print('Warning: unknown atc annotation block ID: {0}'.format(block_id_str))
-            else:
-                var_size = struct.calcsize(format_str)
-                x = struct.unpack(format_str, data[byte_idx:byte_idx+var_size])[0]
-                parsed_block[var_name] = x
-
-                if var_name != 'checksum':
-                    # Updates checksum computation for this block
-                    computed_checksum += sum(bytearray(
-                            data[byte_idx:byte_idx + var_size]))
-
-                if format_str[-1] == 's':
-                    # Decodes any strings and strip out trailing NULLs
-                    parsed_block[var_name] = parsed_block[var_name].decode('ascii')
-                    parsed_block[var_name] = parsed_block[var_name].rstrip('\0')
-                    parsed_block[var_name] = str(parsed_block[var_name])
-
-                if var_name == 'flags':
-                    parsed_block[var_name] = _decode_flags(parsed_block[var_name])
-
-                byte_idx += var_size
-        chksum_ok = parsed_block['checksum'] == computed_checksum
-        return parsed_block, byte_idx, chksum_ok
-
-    def __parse_atc_data_block(self, data, format_str, N, byte_idx, computed_checksum):
-        parsed_data = []
-        var_size = struct.calcsize(format_str)
-        for n in range(0, N):
-            x = struct.unpack(format_str, data[byte_idx:byte_idx + var_size])
-            if len(x) == 1:
-                parsed_data.append(x[0])
-            else:
-                parsed_data.append(x)
-            computed_checksum += sum(bytearray(data[byte_idx:byte_idx + var_size]))
-            byte_idx += var_size
-        return parsed_data, byte_idx, computed_checksum
-
-    def __parse_atc_annotation_block(self, data, format_str, N, byte_idx, computed_checksum):
-        parsed_data = []
-        var_size = struct.calcsize(format_str)
-        for n in range(0, N):
-            x = struct.unpack(format_str, data[byte_idx:byte_idx + var_size])
-            if len(x) == 2:
-                parsed_data.append(x)
-            computed_checksum += sum(bytearray(data[byte_idx:byte_idx + var_size]))
-            byte_idx += var_size
-        return parsed_data, byte_idx, computed_checksum
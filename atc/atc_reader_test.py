@@ -111,6 +111,30 @@ class TestATCReader(unittest.TestCase):
         with self.assertRaises(Exception) as ctx:
             atc_file.get_average_beat(3)
 
+    def test_fingerprints_sample_blocks(self):
+        atc_file = ATCReader('atc/test_data/6_lead_ab.atc', fingerprint=True)
+        self.assertEqual(atc_file.status(), atc_reader.READ_SUCCESS)
+        self.assertIsNotNone(atc_file.block_hash('ecg '))
+        self.assertIsNotNone(atc_file.block_hash('avg2'))
+        self.assertNotEqual(atc_file.block_hash('ecg '), atc_file.block_hash('ecg2'))
+        self.assertIsNone(atc_file.block_hash('info'))
+        self.assertEqual(len(atc_file.fingerprint()), 32)
+        self.assertNotEqual(atc_file.fingerprint(), ATCReader('atc/test_data/6_lead.atc', fingerprint=True).fingerprint())
+        self.assertIsNone(ATCReader('atc/test_data/6_lead_ab.atc').fingerprint())
+
+    def test_fingerprint_ignores_info_block(self):
+        with open('atc/test_data/1_lead.atc', 'rb') as f:
+            atc_bytes = bytearray(f.read())
+        original = ATCReader('atc/test_data/1_lead.atc', fingerprint=True)
+        # Shift one byte of the recording_uuid into the next, keeping the info block checksum valid.
+        atc_bytes[60] += 1
+        atc_bytes[61] -= 1
+        with io.BytesIO(bytes(atc_bytes)) as f:
+            modified = ATCReader(f, fingerprint=True)
+        self.assertEqual(modified.status(), atc_reader.READ_SUCCESS)
+        self.assertNotEqual(modified.recording_uuid(), original.recording_uuid())
+        self.assertEqual(modified.fingerprint(), original.fingerprint())
+
     def test_loads_and_saves_file(self):
         atc_file = ATCReader('atc/test_data/1_lead.atc')
         self.assertEqual(atc_file.status(), atc_reader.READ_SUCCESS)
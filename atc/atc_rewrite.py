@@ -0,0 +1,180 @@
+"""Rewrites info and format block fields of ATC files, copying all other blocks byte-for-byte."""
+import os
+import stat
+import struct
+import tempfile
+
+from atc import atc_file_structure as afs
+from atc import atc_reader
+from atc import atc_writer
+
+
+# Blocks whose fields can be rewritten.
+_editable_block_ids = (afs.info_block_id.encode('ascii'), afs.format_block_id.encode('ascii'))
+
+
+def _field_layout(block_vars):
+    """Maps each field of a fixed-size block to (offset from block start, struct format)."""
+    layout = {}
+    offset = afs.atc_block_id_len
+    for (var_name, type_str) in block_vars:
+        format_str = afs.endianness + type_str
+        layout[var_name] = (offset, format_str)
+        offset += struct.calcsize(format_str)
+    return layout
+
+
+_field_layouts = {
+    afs.info_block_id.encode('ascii'): _field_layout(afs.info_vars),
+    afs.format_block_id.encode('ascii'): _field_layout(afs.fmt_vars),
+}
+
+
+def _edit_block(block, edits, redact):
+    """Applies edits and redactions to a copy of an info or format block and recomputes its checksum.
+
+       Returns: (bytes) the edited block, or None if the original block checksum is incorrect.
+    """
+    block = bytearray(block)
+    checksum = struct.unpack(afs.endianness + 'I', block[-4:])[0]
+    if checksum != sum(block[:-4]):
+        return None
+    layout = _field_layouts[bytes(block[:afs.atc_block_id_len])]
+    for var_name in redact:
+        if var_name in layout:
+            offset, format_str = layout[var_name]
+            block[offset:offset + struct.calcsize(format_str)] = bytes(struct.calcsize(format_str))
+    for var_name, value in edits.items():
+        offset, format_str = layout[var_name]
+        if format_str[-1] == 's':
+            value = atc_writer._pad_binary_string(value, struct.calcsize(format_str))
+        elif var_name == 'flags' and isinstance(value, dict):
+            # Flags which are not specified keep their current values.
+            flags = atc_reader._decode_flags(struct.unpack_from(format_str, block, offset)[0])
+            flags.update(value)
+            value = atc_writer._encode_flags(flags)
+        struct.pack_into(format_str, block, offset, value)
+    struct.pack_into(afs.endianness + 'I', block, len(block) - 4, sum(block[:-4]))
+    return bytes(block)
+
+
+def _check_fields(fields, block_vars):
+    names = [var_name for (var_name, _) in block_vars if var_name not in ('data_length', 'checksum')]
+    for var_name in fields:
+        if var_name not in names:
+            raise ValueError('Cannot rewrite field %s, expected one of %s' % (var_name, ', '.join(names)))
+
+
+def _check_strings(fields, block_vars):
+    """Rejects string values which ATCReader could not decode, or which do not fit their field."""
+    for (var_name, type_str) in block_vars:
+        if var_name in fields and type_str[-1] == 's':
+            try:
+                length = len(fields[var_name].encode('ascii'))
+            except UnicodeEncodeError:
+                raise ValueError('Field %s must be ASCII' % var_name)
+            if length > struct.calcsize(type_str):
+                raise ValueError('Field %s is longer than %d bytes' % (var_name, struct.calcsize(type_str)))
+
+
+def _copy_range(src, dst, offset, count):
+    """Appends count bytes at offset of src to dst, copying in the kernel where the platform supports it."""
+    while count > 0:
+        n = 0
+        try:
+            if hasattr(os, 'copy_file_range'):
+                n = os.copy_file_range(src.fileno(), dst.fileno(), count, offset)
+            elif hasattr(os, 'sendfile'):
+                n = os.sendfile(dst.fileno(), src.fileno(), offset, count)
+        except OSError:
+            # Not supported between these files (i.e. across filesystems), fall back to a userspace copy.
+            n = 0
+        if n == 0:
+            src.seek(offset)
+            chunk = src.read(min(count, 1 << 20))
+            if not chunk:
+                raise OSError('Unexpected end of file at byte %d, %d bytes short' % (offset, count))
+            n = dst.write(chunk)
+        offset += n
+        count -= n
+
+
+def rewrite(src_path, dst_path, info=None, fmt=None, redact=()):
+    """Copies an ATC file, replacing or redacting fields of its info and format blocks.
+
+       Only the info and format blocks are decoded; their checksums are verified and recomputed.  All other blocks
+       are copied byte-for-byte without being parsed.  The output is written to a temporary file next to dst_path,
+       which replaces dst_path once complete.
+
+       Args:
+         src_path (str) The ATC file to read.
+         dst_path (str) The ATC file to write.  May be src_path, to rewrite the file in place.
+         info (dict) New values of info block fields, i.e. {'device_data': 'SER=REDACTED'}.  Strings must be ASCII
+                     and fit their field.
+         fmt (dict) New values of format block fields, i.e. {'flags': {'mains_filter': True}}.  Flags which are not
+                    specified are unchanged.
+         redact ([str]) Names of info block fields to overwrite with zeros, i.e. ['phone_uuid'].
+       Returns: (int) An atc_reader status code.  READ_SUCCESS if the file was rewritten.
+    """
+    edits = {afs.info_block_id.encode('ascii'): info or {}, afs.format_block_id.encode('ascii'): fmt or {}}
+    _check_fields(edits[afs.info_block_id.encode('ascii')], afs.info_vars)
+    _check_fields(edits[afs.format_block_id.encode('ascii')], afs.fmt_vars)
+    _check_strings(edits[afs.info_block_id.encode('ascii')], afs.info_vars)
+    _check_fields(redact, afs.info_vars)
+    if not os.path.exists(src_path):
+        return atc_reader.NO_FILE
+    with open(src_path, 'rb') as src:
+        file_size = os.fstat(src.fileno()).st_size
+        blocks, status = atc_reader._read_block_table(src, file_size)
+        if status != atc_reader.READ_SUCCESS:
+            return status
+        edited_blocks = {}
+        for (block_id, offset, size) in blocks:
+            if block_id in _editable_block_ids:
+                src.seek(offset)
+                edited_blocks[offset] = _edit_block(src.read(size), edits[block_id], redact)
+                if edited_blocks[offset] is None:
+                    return atc_reader.CORRUPT_DATA
+        dst_dir, dst_name = os.path.split(os.path.abspath(dst_path))
+        fd, temp_path = tempfile.mkstemp(prefix='.' + dst_name + '.', suffix='.tmp', dir=dst_dir)
+        try:
+            with open(fd, 'wb', buffering=0) as dst:
+                os.chmod(temp_path, stat.S_IMODE(os.fstat(src.fileno()).st_mode))
+                # Copies runs of unedited blocks in a single range.
+                copy_start = 0
+                for (block_id, offset, size) in blocks:
+                    if offset in edited_blocks:
+                        _copy_range(src, dst, copy_start, offset - copy_start)
+                        dst.write(edited_blocks[offset])
+                        copy_start = offset + size
+                _copy_range(src, dst, copy_start, file_size - copy_start)
+            os.replace(temp_path, dst_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    return atc_reader.READ_SUCCESS
+
+
+def rewrite_directory(src_dir, dst_dir, info=None, fmt=None, redact=()):
+    """Rewrites every .atc file under src_dir into the same relative path under dst_dir.
+
+       Args:
+         src_dir (str) The directory to search for ATC files.
+         dst_dir (str) The directory to write rewritten files to.  Created if it does not exist.  Must not be
+                       src_dir, or a directory inside or containing it.
+         info, fmt, redact: As for rewrite().
+       Returns: (dict) The atc_reader status code of each file, keyed by path relative to src_dir.
+    """
+    src_real, dst_real = os.path.realpath(src_dir), os.path.realpath(dst_dir)
+    if os.path.commonpath([src_real, dst_real]) in (src_real, dst_real):
+        raise ValueError('Destination directory %s overlaps source directory %s' % (dst_dir, src_dir))
+    statuses = {}
+    for root, _, file_names in os.walk(src_dir):
+        for file_name in sorted(file_names):
+            if not file_name.endswith('.atc'):
+                continue
+            rel_path = os.path.relpath(os.path.join(root, file_name), src_dir)
+            os.makedirs(os.path.dirname(os.path.join(dst_dir, rel_path)), exist_ok=True)
+            statuses[rel_path] = rewrite(
+                    os.path.join(src_dir, rel_path), os.path.join(dst_dir, rel_path), info, fmt, redact)
+    return statuses
@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from atc import atc_reader
+from atc import atc_rewrite
+from atc.atc_reader import ATCReader
+
+
+class TestATCRewrite(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertSamplesEqual(self, a, b):
+        self.assertEqual(a.num_leads(), b.num_leads())
+        for lead in range(1, a.num_leads() + 1):
+            self.assertListEqual(a.get_ecg_samples(lead), b.get_ecg_samples(lead))
+        self.assertEqual(a.get_annotations(), b.get_annotations())
+
+    def test_redacts_info_fields(self):
+        dst = os.path.join(self.temp_dir, 'redacted.atc')
+        status = atc_rewrite.rewrite('atc/test_data/6_lead_ab.atc', dst, info={'device_data': 'SER=REDACTED'},
+                                     redact=['phone_uuid', 'recording_uuid'])
+        self.assertEqual(status, atc_reader.READ_SUCCESS)
+        original = ATCReader('atc/test_data/6_lead_ab.atc')
+        rewritten = ATCReader(dst)
+        self.assertEqual(rewritten.status(), atc_reader.READ_SUCCESS)
+        self.assertEqual(rewritten.device_data(), 'SER=REDACTED')
+        self.assertEqual(rewritten.phone_uuid(), '')
+        self.assertEqual(rewritten.recording_uuid(), '')
+        self.assertEqual(rewritten.phone_model(), original.phone_model())
+        self.assertEqual(rewritten.date_recorded(), original.date_recorded())
+        self.assertSamplesEqual(rewritten, original)
+        self.assertListEqual(rewritten.get_average_beat(2), original.get_average_beat(2))
+        # Every byte after the info block is copied unchanged.
+        with open('atc/test_data/6_lead_ab.atc', 'rb') as f:
+            original_bytes = f.read()
+        with open(dst, 'rb') as f:
+            rewritten_bytes = f.read()
+        self.assertEqual(len(rewritten_bytes), len(original_bytes))
+        self.assertEqual(rewritten_bytes[288:], original_bytes[288:])
+
+    def test_rewrites_format_fields(self):
+        dst = os.path.join(self.temp_dir, 'filtered.atc')
+        status = atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst,
+                                     fmt={'flags': {'mains_frequency_hz': 50, 'baseline_filter': True}})
+        self.assertEqual(status, atc_reader.READ_SUCCESS)
+        rewritten = ATCReader(dst)
+        self.assertEqual(rewritten.status(), atc_reader.READ_SUCCESS)
+        self.assertEqual(rewritten.mains_frequency_hz(), 50)
+        self.assertTrue(rewritten.baseline_filtered())
+        self.assertSamplesEqual(rewritten, ATCReader('atc/test_data/1_lead.atc'))
+        # Flags which are not specified are unchanged.
+        original = ATCReader('atc/test_data/1_lead.atc')
+        status = atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, fmt={'flags': {'baseline_filter': True}})
+        self.assertEqual(status, atc_reader.READ_SUCCESS)
+        rewritten = ATCReader(dst)
+        self.assertTrue(rewritten.baseline_filtered())
+        flags = dict(original.dict['fmt ']['flags'], baseline_filter=True)
+        self.assertEqual(rewritten.dict['fmt ']['flags'], flags)
+        self.assertEqual(rewritten.mains_frequency_hz(), original.mains_frequency_hz())
+
+    def test_rejects_unknown_fields(self):
+        dst = os.path.join(self.temp_dir, 'out.atc')
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, info={'checksum': 0})
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, redact=['data'])
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, redact=['sample_rate_hz'])
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, info={'device_data': '\u00e9' * 52})
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, info={'device_data': 'X' * 53})
+        self.assertFalse(os.path.exists(dst))
+        self.assertEqual(atc_rewrite.rewrite('atc/test_data/1_lead.atc', dst, info={'device_data': 'X' * 52}),
+                         atc_reader.READ_SUCCESS)
+        self.assertEqual(ATCReader(dst).device_data(), 'X' * 52)
+
+    def test_reports_read_errors(self):
+        dst = os.path.join(self.temp_dir, 'out.atc')
+        self.assertEqual(atc_rewrite.rewrite('nonexistent_file.atc', dst), atc_reader.NO_FILE)
+        with open('atc/test_data/1_lead.atc', 'rb') as f:
+            atc_bytes = bytearray(f.read())
+        truncated = os.path.join(self.temp_dir, 'truncated.atc')
+        with open(truncated, 'wb') as f:
+            f.write(atc_bytes[:1000])
+        self.assertEqual(atc_rewrite.rewrite(truncated, dst), atc_reader.MISSING_DATA)
+        atc_bytes[296] = 0  # Format block of this file starts at byte 288
+        corrupt = os.path.join(self.temp_dir, 'corrupt.atc')
+        with open(corrupt, 'wb') as f:
+            f.write(atc_bytes)
+        self.assertEqual(atc_rewrite.rewrite(corrupt, dst), atc_reader.CORRUPT_DATA)
+
+    def test_copies_without_kernel_copy(self):
+        dst = os.path.join(self.temp_dir, 'out.atc')
+        with mock.patch('os.copy_file_range', side_effect=OSError, create=True):
+            status = atc_rewrite.rewrite('atc/test_data/6_lead.atc', dst, redact=['phone_uuid'])
+        self.assertEqual(status, atc_reader.READ_SUCCESS)
+        self.assertSamplesEqual(ATCReader(dst), ATCReader('atc/test_data/6_lead.atc'))
+
+    def test_rewrites_in_place(self):
+        path = os.path.join(self.temp_dir, '6_lead.atc')
+        shutil.copy('atc/test_data/6_lead.atc', path)
+        status = atc_rewrite.rewrite(path, path, info={'device_data': 'SER=REDACTED'}, redact=['phone_uuid'])
+        self.assertEqual(status, atc_reader.READ_SUCCESS)
+        rewritten = ATCReader(path)
+        self.assertEqual(rewritten.status(), atc_reader.READ_SUCCESS)
+        self.assertEqual(rewritten.device_data(), 'SER=REDACTED')
+        self.assertEqual(rewritten.phone_uuid(), '')
+        self.assertSamplesEqual(rewritten, ATCReader('atc/test_data/6_lead.atc'))
+        self.assertListEqual(os.listdir(self.temp_dir), ['6_lead.atc'])
+
+    def test_copy_stops_at_end_of_file(self):
+        src_path = os.path.join(self.temp_dir, 'src.atc')
+        shutil.copy('atc/test_data/1_lead.atc', src_path)
+        size = os.path.getsize(src_path)
+        with open(src_path, 'rb') as src, open(os.path.join(self.temp_dir, 'dst.atc'), 'wb', buffering=0) as dst:
+            with mock.patch('os.copy_file_range', side_effect=OSError, create=True):
+                with self.assertRaises(OSError):
+                    atc_rewrite._copy_range(src, dst, size - 10, 100)
+            with self.assertRaises(OSError):
+                atc_rewrite._copy_range(src, dst, size - 10, 100)
+
+    def test_rejects_overlapping_directories(self):
+        shutil.copy('atc/test_data/1_lead.atc', self.temp_dir)
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite_directory(self.temp_dir, self.temp_dir, redact=['phone_uuid'])
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite_directory(self.temp_dir, os.path.join(self.temp_dir, 'out'), redact=['phone_uuid'])
+        with self.assertRaises(ValueError):
+            atc_rewrite.rewrite_directory(self.temp_dir, os.path.dirname(self.temp_dir), redact=['phone_uuid'])
+
+    def test_rewrites_directory(self):
+        src_dir = os.path.join(self.temp_dir, 'src')
+        os.makedirs(os.path.join(src_dir, 'nested'))
+        shutil.copy('atc/test_data/1_lead.atc', src_dir)
+        shutil.copy('atc/test_data/6_lead.atc', os.path.join(src_dir, 'nested'))
+        shutil.copy('atc/test_data/broken_checksum.atc', src_dir)
+        dst_dir = os.path.join(self.temp_dir, 'dst')
+        statuses = atc_rewrite.rewrite_directory(src_dir, dst_dir, redact=['phone_uuid'])
+        self.assertEqual(statuses['1_lead.atc'], atc_reader.READ_SUCCESS)
+        self.assertEqual(statuses[os.path.join('nested', '6_lead.atc')], atc_reader.READ_SUCCESS)
+        self.assertEqual(ATCReader(os.path.join(dst_dir, 'nested', '6_lead.atc')).phone_uuid(), '')
+        self.assertIn('broken_checksum.atc', statuses)
+
+
+if __name__ == '__main__':
+    unittest.main()
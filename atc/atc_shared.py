@@ -0,0 +1,255 @@
+"""Shares decoded ATC recordings between processes through shared memory, without copying samples.
+
+share() copies a recording's leads, average beats and annotations into a multiprocessing.shared_memory segment
+and returns an ATCSharedRecording.  Its descriptor() is a small picklable dict which other processes pass to
+ATCSharedRecording to map the same segment.  The segment holds a reference count, and is unlinked when the last
+ATCSharedRecording referring to it is closed or garbage collected.  Requires numpy, and fcntl to lock the reference
+count.
+
+A process killed before releasing its references leaves the segment behind (on Linux, in /dev/shm).  Once no process
+uses it, remove it with unlink(name).
+"""
+import contextlib
+import fcntl
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import os
+import struct
+import tempfile
+import weakref
+
+import numpy as np
+
+from atc import atc_file_structure as afs
+from atc import atc_reader
+from atc.atc_reader import ATCReader
+
+
+_refcount_format = afs.endianness + 'Q'
+_alignment = 8
+
+# Sample arrays in the segment, keyed by block ID.
+_sample_dtype = afs.endianness + 'i2'
+_ann_offsets_id = 'ann offsets'
+_ann_offsets_dtype = afs.endianness + 'u4'
+_ann_types_id = 'ann types'
+_ann_types_dtype = afs.endianness + 'u2'
+
+
+def _attach(name=None, size=0):
+    """Creates (if size > 0) or attaches to a segment whose lifetime is managed by its reference count."""
+    shm = shared_memory.SharedMemory(name=name, create=size > 0, size=size)
+    # The resource tracker would unlink the segment when the process which created or attached it exits,
+    # regardless of references held by other processes.
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _unlink(shm):
+    # SharedMemory.unlink unregisters the segment from the resource tracker, which reports an error unless the
+    # segment is registered.
+    resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+@contextlib.contextmanager
+def _refcount_lock(name, create=False):
+    """Locks the reference count of a segment.
+
+       The lock file is created with the segment and removed when the segment is unlinked, under the lock, so
+       FileNotFoundError is raised unless create is True once the segment has been unlinked.  A process which opened
+       the lock file before it was removed finds the reference count is zero.
+    """
+    path = os.path.join(tempfile.gettempdir(), 'atc_shared_%s.lock' % name.lstrip('/'))
+    with open(os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o666)) as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield path
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _add_reference(shm, n):
+    """Adds n (which may be negative) to the reference count of a segment, returns the new count."""
+    refcount = struct.unpack_from(_refcount_format, shm.buf, 0)[0] + n
+    struct.pack_into(_refcount_format, shm.buf, 0, refcount)
+    return refcount
+
+
+def unlink(name):
+    """Removes a segment regardless of its reference count, i.e. one orphaned by a process which was killed.
+
+       Processes which still map the segment can continue to use it, but no process can attach to it.
+    """
+    shm = _attach(name)
+    with _refcount_lock(shm.name, create=True) as lock_path:
+        # Recordings which still map the segment find it has no references, and do not unlink it again.
+        struct.pack_into(_refcount_format, shm.buf, 0, 0)
+        _unlink(shm)
+        os.unlink(lock_path)
+    shm.close()
+
+
+class _Mapping:
+    """A process's mapping of a segment, holding one reference to the segment.
+
+       The mapping is only closed once the reference is released and no arrays backed by it remain, since numpy
+       arrays do not prevent the mapping from being closed, and reading them afterwards would crash.
+    """
+    def __init__(self, shm):
+        self.shm = shm
+        self.released = False
+        self.live_arrays = 0
+
+    def track(self, array):
+        self.live_arrays += 1
+        weakref.finalize(array, self.array_released)
+
+    def array_released(self):
+        self.live_arrays -= 1
+        self.close_if_unused()
+
+    def release(self):
+        try:
+            with _refcount_lock(self.shm.name) as lock_path:
+                if _add_reference(self.shm, 0) > 0 and _add_reference(self.shm, -1) == 0:
+                    _unlink(self.shm)
+                    os.unlink(lock_path)
+        except FileNotFoundError:
+            pass  # Already removed by unlink().
+        self.released = True
+        self.close_if_unused()
+
+    def close_if_unused(self):
+        if self.released and self.live_arrays == 0 and self.shm.buf is not None:
+            self.shm.close()
+
+
+def share(reader, name=None):
+    """Copies the decoded samples and annotations of a recording into a new shared memory segment.
+
+       Args:
+         reader (ATCReader) A successfully read recording.
+         name (str) The name of the segment.  A unique name is generated if None.
+       Returns: (ATCSharedRecording) Holding the first reference to the segment.
+    """
+    if reader.status() != atc_reader.READ_SUCCESS:
+        raise ValueError('Cannot share a recording with read status %d' % reader.status())
+    arrays = {}
+    for block_id in afs.lead_ids + afs.avg_ids:
+        if block_id in reader.dict:
+            arrays[block_id] = np.asarray(reader.dict[block_id]['data'], dtype=_sample_dtype)
+    if 'ann ' in reader.dict:
+        annotations = reader.dict['ann ']['annotations']
+        arrays[_ann_offsets_id] = np.array([a[0] for a in annotations], dtype=_ann_offsets_dtype)
+        arrays[_ann_types_id] = np.array([a[1] for a in annotations], dtype=_ann_types_dtype)
+    layout = {}
+    offset = struct.calcsize(_refcount_format)
+    for array_id, array in arrays.items():
+        offset = -(-offset // _alignment) * _alignment
+        layout[array_id] = (offset, len(array), array.dtype.str)
+        offset += array.nbytes
+    shm = _attach(name, size=max(offset, 1))
+    for array_id, array in arrays.items():
+        np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=layout[array_id][0])[:] = array
+    struct.pack_into(_refcount_format, shm.buf, 0, 1)
+    with _refcount_lock(shm.name, create=True):
+        pass
+    descriptor = {
+        'name': shm.name,
+        'layout': layout,
+        'header': reader.dict.get('header'),
+        'info': reader.dict.get('info'),
+        'fmt ': reader.dict['fmt '],
+        'tick_frequency': reader.dict['ann ']['tick_frequency'] if 'ann ' in reader.dict else None,
+    }
+    return ATCSharedRecording(descriptor, acquire=False, _shm=shm)
+
+
+class ATCSharedRecording(ATCReader):
+    """A recording in a shared memory segment, with the accessors of ATCReader.
+
+       Samples are returned as read-only numpy arrays backed by the segment.  Arrays obtained before close() remain
+       valid; the segment stays mapped in this process until they are garbage collected.
+    """
+    def __init__(self, descriptor, acquire=True, _shm=None):
+        """Maps a shared recording into this process.
+
+           Args:
+             descriptor (dict) The descriptor() of a shared recording.
+             acquire (bool) Add a reference to the segment.  False to adopt the reference added by retain().
+           Raises: FileNotFoundError if the segment has been unlinked.
+        """
+        self.__descriptor = descriptor
+        self.__shm = _shm or _attach(descriptor['name'])
+        if acquire:
+            try:
+                with _refcount_lock(self.__shm.name):
+                    # The last reference may have been released after the segment was mapped.
+                    if _add_reference(self.__shm, 0) == 0:
+                        raise FileNotFoundError('Shared recording %s has been released' % descriptor['name'])
+                    _add_reference(self.__shm, 1)
+            except FileNotFoundError:
+                self.__shm.close()
+                raise
+        mapping = _Mapping(self.__shm)
+        # Releases the reference if this recording is garbage collected, or at exit, without being closed.
+        self.__release = weakref.finalize(self, mapping.release)
+        self.dict = {'header': descriptor['header'], 'info': descriptor['info'], 'fmt ': descriptor['fmt ']}
+        arrays = {}
+        for array_id, (offset, length, dtype) in descriptor['layout'].items():
+            arrays[array_id] = np.ndarray((length,), dtype, buffer=self.__shm.buf, offset=offset)
+            arrays[array_id].flags.writeable = False
+            mapping.track(arrays[array_id])
+        for block_id in afs.lead_ids + afs.avg_ids:
+            if block_id in arrays:
+                self.dict[block_id] = {'data_length': len(arrays[block_id]) * 2, 'data': arrays[block_id]}
+        if _ann_offsets_id in arrays:
+            self.dict['ann '] = {'tick_frequency': descriptor['tick_frequency'],
+                                 'offsets': arrays[_ann_offsets_id], 'beat_types': arrays[_ann_types_id]}
+
+    def close(self):
+        """Releases this reference to the segment, unlinking the segment if it was the last reference."""
+        if self.__shm is None:
+            return
+        self.dict = None
+        self.__shm = None
+        self.__release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def status(self):
+        return atc_reader.READ_SUCCESS  # Only successfully read recordings are shared.
+
+    def name(self):
+        """The name of the shared memory segment."""
+        return self.__descriptor['name']
+
+    def descriptor(self):
+        """The descriptor to pass to ATCSharedRecording in another process."""
+        return self.__descriptor
+
+    def retain(self):
+        """Adds a reference on behalf of another process, which adopts it with ATCSharedRecording(descriptor,
+           acquire=False).  This keeps the segment alive even if this recording is closed before the other process
+           maps it.  Returns the descriptor.
+        """
+        with _refcount_lock(self.__shm.name):
+            _add_reference(self.__shm, 1)
+        return self.__descriptor
+
+    def references(self):
+        """The number of references to the segment, zero once it has been removed by unlink()."""
+        try:
+            with _refcount_lock(self.__shm.name):
+                return _add_reference(self.__shm, 0)
+        except FileNotFoundError:
+            return 0
+
+    def get_annotations(self):
+        """Get beat annotations.  Returns pair of offsets, beat_types"""
+        return self.dict['ann ']['offsets'], self.dict['ann ']['beat_types']
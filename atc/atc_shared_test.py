@@ -0,0 +1,141 @@
+import gc
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from atc import atc_reader
+from atc import atc_shared
+from atc.atc_reader import ATCReader
+
+
+def _summarize_shared_recording(descriptor, results):
+    with atc_shared.ATCSharedRecording(descriptor, acquire=False) as recording:
+        offsets, beat_types = recording.get_annotations()
+        results.put((recording.num_leads(), recording.sample_rate_hz(), recording.recording_uuid(),
+                     recording.get_ecg_samples(3).tolist(), offsets.tolist(), recording.references()))
+
+
+def _adopt_without_closing(descriptor, results):
+    recording = atc_shared.ATCSharedRecording(descriptor, acquire=False)
+    results.put(recording.references())
+
+
+class TestATCShared(unittest.TestCase):
+
+    def test_shares_recording(self):
+        reader = ATCReader('atc/test_data/6_lead_ab.atc')
+        with atc_shared.share(reader) as recording:
+            self.assertEqual(recording.status(), atc_reader.READ_SUCCESS)
+            self.assertEqual(recording.num_leads(), 6)
+            for lead in range(1, 7):
+                self.assertListEqual(recording.get_ecg_samples(lead).tolist(), reader.get_ecg_samples(lead))
+            self.assertListEqual(recording.get_average_beat(2).tolist(), reader.get_average_beat(2))
+            offsets, beat_types = recording.get_annotations()
+            self.assertEqual((offsets.tolist(), beat_types.tolist()), reader.get_annotations())
+            self.assertEqual(recording.mains_frequency_hz(), reader.mains_frequency_hz())
+            self.assertEqual(recording.device_data(), reader.device_data())
+            self.assertFalse(recording.get_ecg_samples(1).flags.writeable)
+            # The descriptor is small, the samples stay in the segment.
+            self.assertLess(len(pickle.dumps(recording.descriptor())), 2000)
+
+    def test_shares_recording_across_processes(self):
+        reader = ATCReader('atc/test_data/6_lead.atc')
+        recording = atc_shared.share(reader)
+        results = multiprocessing.Queue()
+        worker = multiprocessing.Process(target=_summarize_shared_recording, args=(recording.retain(), results))
+        worker.start()
+        # The segment outlives the process which shared it while the worker holds its reference.
+        recording.close()
+        num_leads, sample_rate_hz, recording_uuid, samples, offsets, references = results.get(timeout=30)
+        worker.join()
+        self.assertEqual(num_leads, 6)
+        self.assertEqual(sample_rate_hz, reader.sample_rate_hz())
+        self.assertEqual(recording_uuid, reader.recording_uuid())
+        self.assertListEqual(samples, reader.get_ecg_samples(3))
+        self.assertListEqual(offsets, reader.get_annotations()[0])
+        self.assertEqual(references, 1)
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(recording.name())
+
+    def test_counts_references(self):
+        recording = atc_shared.share(ATCReader('atc/test_data/1_lead.atc'))
+        view = atc_shared.ATCSharedRecording(recording.descriptor())
+        self.assertEqual(recording.references(), 2)
+        np.testing.assert_array_equal(view.get_ecg_samples(1), recording.get_ecg_samples(1))
+        recording.close()
+        recording.close()
+        self.assertEqual(view.references(), 1)
+        view.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(recording.name())
+
+    def test_arrays_outlive_close(self):
+        reader = ATCReader('atc/test_data/6_lead_ab.atc')
+        with atc_shared.ATCSharedRecording(atc_shared.share(reader).retain(), acquire=False) as recording:
+            samples = recording.get_ecg_samples(1)
+            offsets, beat_types = recording.get_annotations()
+        recording.close()
+        self.assertListEqual(samples[:100].tolist(), reader.get_ecg_samples(1)[:100])
+        self.assertListEqual(beat_types.tolist(), reader.get_annotations()[1])
+
+    def test_releases_reference_without_close(self):
+        recording = atc_shared.share(ATCReader('atc/test_data/1_lead.atc'))
+        results = multiprocessing.Queue()
+        worker = multiprocessing.Process(target=_adopt_without_closing, args=(recording.retain(), results))
+        worker.start()
+        self.assertEqual(results.get(timeout=30), 2)
+        worker.join()
+        self.assertEqual(recording.references(), 1)
+        name = recording.name()
+        del recording
+        gc.collect()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name)
+
+    def test_unlinks_orphaned_segment(self):
+        recording = atc_shared.share(ATCReader('atc/test_data/1_lead.atc'))
+        recording.retain()  # Reference of a process which was killed before releasing it.
+        recording.close()
+        atc_shared.unlink(recording.name())
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(recording.name())
+
+    def test_closes_recording_after_unlink(self):
+        recording = atc_shared.share(ATCReader('atc/test_data/1_lead.atc'))
+        view = atc_shared.ATCSharedRecording(recording.descriptor())
+        samples = view.get_ecg_samples(1)
+        atc_shared.unlink(recording.name())
+        self.assertEqual(recording.references(), 0)
+        self.assertEqual(samples[0], ATCReader('atc/test_data/1_lead.atc').get_ecg_samples(1)[0])
+        recording.close()
+        view.close()
+        with self.assertRaises(FileNotFoundError):
+            atc_shared.ATCSharedRecording(recording.descriptor())
+        self.assertFalse(os.path.exists(
+                os.path.join(tempfile.gettempdir(), 'atc_shared_%s.lock' % recording.name().lstrip('/'))))
+
+    def test_rejects_released_segment(self):
+        recording = atc_shared.share(ATCReader('atc/test_data/1_lead.atc'))
+        # Maps the segment as if its last reference was released before the reference count was locked.
+        shm = atc_shared._attach(recording.name())
+        with mock.patch.object(atc_shared, '_attach', return_value=shm):
+            with mock.patch.object(atc_shared, '_add_reference', return_value=0):
+                with self.assertRaises(FileNotFoundError):
+                    atc_shared.ATCSharedRecording(recording.descriptor())
+        self.assertIsNone(shm.buf)
+        self.assertEqual(recording.references(), 1)
+        recording.close()
+
+    def test_rejects_unread_recording(self):
+        with self.assertRaises(ValueError):
+            atc_shared.share(ATCReader('nonexistent_file.atc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ import io
 import struct
 
 from atc import atc_file_structure as afs
+from atc import atc_fingerprint
 from atc import atc_flags
 from atc import atc_header
 
@@ -37,12 +38,20 @@ def _pad_binary_string(s, l):
 
 
 class ATCWriter:
-    def __init__(self, path_or_file):
+    def __init__(self, path_or_file, fingerprint=False):
+        """Opens an ATC file for writing.
+
+           Args:
+             path_or_file (str/file) Path of the ATC file, or a binary file object.
+             fingerprint (bool) Hash the content of each sample block as it is written.
+        """
         if isinstance(path_or_file, str):
             self.__f = open(path_or_file, 'wb')
         else:
             self.__f = path_or_file
         self.__sample_rate_hz = None  # Will be set by write_header
+        self.__ecg_filter = None  # May be set by write_header
+        self.__block_hashes = {} if fingerprint else None
 
     def close(self):
         self.__f.close()
@@ -54,8 +63,20 @@ class ATCWriter:
     def __exit__(self, *args):
         self.__f.close()
 
+    def block_hash(self, block_id):
+        """Hex digest of the samples written to a block, i.e. 'ecg ', if the writer was created with fingerprint=True."""
+        if self.__block_hashes is None:
+            return None
+        return self.__block_hashes.get(block_id)
+
+    def fingerprint(self):
+        """Fingerprint of the sample blocks written so far, if the writer was created with fingerprint=True."""
+        if self.__block_hashes is None:
+            return None
+        return atc_fingerprint.recording_fingerprint(self.__block_hashes)
+
     def write_header(self, date_recorded, recording_uuid, phone_uuid, phone_model, recorder_software, recorder_hardware,
-                     device_data, flags, sample_rate_hz, mains_frequency_hz):
+                     device_data, flags, sample_rate_hz, mains_frequency_hz, ecg_filter=None):
         """Write ATC header and format block.  Should be called before writing data segments.
 
            Args:
@@ -71,10 +92,24 @@ class ATCWriter:
              flags (dict) A dictionary of boolean values of the ATC flags field.
              sample_rate_hz (int) The recording sample rate in hz.
              mains_frequency_hz (int) The mains frequency in hz.
+             ecg_filter (atc_filter.ECGFilter) If set, filters every lead written by write_ecg_samples, and sets the
+                                               flags of the filters it applies.  Must be designed for sample_rate_hz
+                                               and, if it applies the notch filter, mains_frequency_hz.
 
             Returns: True if write succeeded, False if write failed.
         """
+        if ecg_filter is not None:
+            if ecg_filter.sample_rate_hz() != sample_rate_hz:
+                raise ValueError('ecg_filter was designed for %s hz samples, not %s hz'
+                                 % (ecg_filter.sample_rate_hz(), sample_rate_hz))
+            if ecg_filter.flags()['notch_mains_filter'] and ecg_filter.mains_frequency_hz() != mains_frequency_hz:
+                raise ValueError('ecg_filter removes %s hz mains, not %s hz'
+                                 % (ecg_filter.mains_frequency_hz(), mains_frequency_hz))
         self.__sample_rate_hz = sample_rate_hz
+        self.__ecg_filter = ecg_filter
+        if ecg_filter is not None:
+            flags = dict(flags)
+            flags.update({k: v for (k, v) in ecg_filter.flags().items() if v})
         # Writes Header
         self.__f.write(atc_header.ALIVE_SIG.encode('ascii'))
         self.__f.write(struct.pack(afs.endianness + 'I', atc_header.ATC_VERSION))
@@ -125,6 +160,8 @@ class ATCWriter:
            Returns: (int) number of bytes written.
         """
         block_id = afs.lead_ids[lead - 1]
+        if self.__ecg_filter is not None:
+            samples = self.__ecg_filter.apply_atc(samples)
         return self.__write_data_block(samples, block_id)
 
     def write_average_beat(self, average_beat, lead):
@@ -169,6 +206,10 @@ class ATCWriter:
             db.write(struct.pack(afs.endianness + 'I', data_length_bytes))  # Data block length
             for x in sample_data:
                 db.write(struct.pack(afs.endianness + 'h', x))
+            if self.__block_hashes is not None:
+                hasher = atc_fingerprint.block_hasher()
+                hasher.update(db.getbuffer()[afs.atc_block_id_len + 4:])
+                self.__block_hashes[block_id] = hasher.hexdigest()
             data_checksum = sum(bytearray(db.getbuffer()))
             db.write(struct.pack(afs.endianness + 'I', data_checksum))
             return self.__f.write(db.getbuffer())
@@ -99,6 +99,21 @@ class TestATCWriter(unittest.TestCase):
             self.assertEqual(writer.write_annotations(offsets, beat_types), 28)
         os.unlink(temp_file.name)
 
+    def test_fingerprints_written_samples(self):
+        atc_file = ATCReader('atc/test_data/6_lead_ab.atc', fingerprint=True)
+        self.assertEqual(atc_file.status(), atc_reader.READ_SUCCESS)
+        with io.BytesIO() as f:
+            writer = ATCWriter(f, fingerprint=True)
+            writer.write_header('DATE_RECORDED', 'UUID_123', '', 'ATCFileWriterTest', 'TestWritesFile', '', '', {},
+                                atc_file.sample_rate_hz(), atc_file.mains_frequency_hz())
+            for lead in range(1, 7):
+                writer.write_ecg_samples(atc_file.get_ecg_samples(lead), lead)
+            writer.write_average_beat(atc_file.get_average_beat(1), 1)
+            writer.write_average_beat(atc_file.get_average_beat(2), 2)
+            self.assertEqual(writer.block_hash('ecg3'), atc_file.block_hash('ecg3'))
+            self.assertEqual(writer.fingerprint(), atc_file.fingerprint())
+        self.assertIsNone(ATCWriter(io.BytesIO()).fingerprint())
+
     def test_saves_average_beats(self):
         atc_file = ATCReader('atc/test_data/6_lead_ab.atc')
         self.assertEqual(atc_file.status(), atc_reader.READ_SUCCESS)